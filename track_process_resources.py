@@ -14,17 +14,63 @@ No third-party dependencies are required.
 from __future__ import annotations
 
 import argparse
+import ctypes
 import curses
+import errno
+import functools
+import heapq
+import itertools
+import math
 import os
+import resource
+import select
 import signal
+import socket
+import struct
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Set, Tuple
+from typing import AbstractSet, Callable, Dict, List, Optional, Set, Tuple, Union
 
 
 STOP = False
+_CGROUP_WATCHER: Optional[CgroupWatcher] = None
+
+# inotify(7) events that signal a change in the cgroup directory tree.
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_ONLYDIR = 0x01000000
+_IN_WATCH_MASK = _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_ONLYDIR
+
+# Kernel proc connector (cn_proc) netlink protocol, see linux/cn_proc.h.
+_NETLINK_CONNECTOR = 11
+_CN_IDX_PROC = 1
+_CN_VAL_PROC = 1
+_PROC_CN_MCAST_LISTEN = 1
+_NLMSG_DONE = 3
+_PROC_EVENT_FORK = 0x00000001
+_PROC_EVENT_EXEC = 0x00000002
+_PROC_EVENT_EXIT = 0x80000000
+_NLMSG_HDR = struct.Struct("=IHHII")
+_CN_MSG_HDR = struct.Struct("=IIIIHH")
+_PROC_EVENT_HDR = struct.Struct("=IIQ")
+# The first four u32s of the fork/exec/exit event payloads: fork carries
+# (parent_pid, parent_tgid, child_pid, child_tgid), exec and exit start with
+# (process_pid, process_tgid).
+_PROC_EVENT_PIDS = struct.Struct("=IIII")
+
+# open() errors meaning the process or system is out of file descriptors.
+_FD_EXHAUSTED = (errno.EMFILE, errno.ENFILE)
+# Descriptors left free for everything besides the per-pid /proc cache (stdio,
+# cgroup.procs reads, cmdline reads, inotify, netlink, the worker threads).
+_FD_RESERVE = 128
+
+# Pids per thread-pool task when reading /proc in parallel; smaller pid sets
+# are read inline since task dispatch would cost more than the reads.
+_READ_CHUNK = 32
 
 
 def _handle_signal(signum, frame):
@@ -33,30 +79,20 @@ def _handle_signal(signum, frame):
     STOP = True
 
 
-@dataclass
+@dataclass(slots=True)
 class MetricAccumulator:
     minimum: float = float("inf")
     maximum: float = float("-inf")
     total: float = 0.0
     count: int = 0
 
-    def add(self, value: Optional[float]) -> None:
-        if value is None:
-            return
-        if value < self.minimum:
-            self.minimum = value
-        if value > self.maximum:
-            self.maximum = value
-        self.total += value
-        self.count += 1
-
     def as_tuple(self) -> Tuple[float, float, float]:
         if self.count == 0:
             return (0.0, 0.0, 0.0)
         return (self.minimum, self.maximum, self.total / self.count)
 
 
-@dataclass
+@dataclass(slots=True)
 class ProcessStats:
     pid: int
     name: str
@@ -68,73 +104,270 @@ class ProcessStats:
     disk: MetricAccumulator = field(default_factory=MetricAccumulator)
     xfer: MetricAccumulator = field(default_factory=MetricAccumulator)
     current_cpu: float = 0.0
-    current_mem: float = 0.0
+    current_mem: int = 0
     current_disk: float = 0.0
     current_xfer: float = 0.0
     cmdline: str = ""
-
-
-@dataclass
-class PrevSample:
-    cpu_ticks: int
-    disk_bytes: int
-    xfer_bytes: int
-    timestamp: float
-
-
-def read_stat(pid: int) -> Optional[Tuple[str, int, int, int]]:
-    """Return (name, ppid, total_cpu_ticks, rss_pages)."""
-    path = f"/proc/{pid}/stat"
+    # Raw counters from the previous sample; prev_timestamp is None until the
+    # first one.
+    prev_cpu_ticks: int = 0
+    prev_disk_bytes: int = 0
+    prev_xfer_bytes: int = 0
+    prev_timestamp: Optional[float] = None
+
+    def add_sample(
+        self,
+        cpu: Optional[float],
+        mem: Optional[int],
+        disk: Optional[float],
+        xfer: Optional[float],
+    ) -> None:
+        """Accumulate one sample of every metric; None values are skipped."""
+        # The min/max/sum/count update is written out per metric, so a sample
+        # costs one method call instead of one per accumulator.
+        if cpu is not None:
+            acc = self.cpu
+            if cpu < acc.minimum:
+                acc.minimum = cpu
+            if cpu > acc.maximum:
+                acc.maximum = cpu
+            acc.total += cpu
+            acc.count += 1
+        if mem is not None:
+            acc = self.mem
+            if mem < acc.minimum:
+                acc.minimum = mem
+            if mem > acc.maximum:
+                acc.maximum = mem
+            acc.total += mem
+            acc.count += 1
+        if disk is not None:
+            acc = self.disk
+            if disk < acc.minimum:
+                acc.minimum = disk
+            if disk > acc.maximum:
+                acc.maximum = disk
+            acc.total += disk
+            acc.count += 1
+        if xfer is not None:
+            acc = self.xfer
+            if xfer < acc.minimum:
+                acc.minimum = xfer
+            if xfer > acc.maximum:
+                acc.maximum = xfer
+            acc.total += xfer
+            acc.count += 1
+
+
+# Zero-based field offsets, counted from the first field after the ")" that
+# closes comm: ppid, utime, stime, rss.
+_STAT_PPID, _STAT_UTIME, _STAT_STIME, _STAT_RSS = 1, 11, 12, 21
+
+# /proc/<pid>/io has a fixed "key: value" line layout:
+# rchar, wchar, syscr, syscw, read_bytes, write_bytes, cancelled_write_bytes.
+# Indices below are into its whitespace-split tokens, i.e. line * 2 + 1.
+_IO_RCHAR, _IO_WCHAR, _IO_READ_BYTES, _IO_WRITE_BYTES = 1, 3, 9, 11
+
+
+def _parse_stat_tail(raw: bytes, start: int) -> Optional[Tuple[int, int, int, int]]:
+    """Return (ppid, utime, stime, rss_pages) from the stat fields at raw[start:]."""
+    # A bounded split keeps the field scan in C and stops right after rss.
+    tail = raw[start:].split(None, _STAT_RSS + 1)
+    if len(tail) <= _STAT_RSS:
+        return None
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            raw = f.read().strip()
-    except (FileNotFoundError, PermissionError, ProcessLookupError):
+        return (int(tail[_STAT_PPID]), int(tail[_STAT_UTIME]), int(tail[_STAT_STIME]), int(tail[_STAT_RSS]))
+    except ValueError:
         return None
 
-    lpar = raw.find("(")
-    rpar = raw.rfind(")")
-    if lpar == -1 or rpar == -1 or rpar <= lpar:
+
+def parse_stat(raw: bytes) -> Optional[Tuple[str, int, int, int]]:
+    """Parse /proc/<pid>/stat contents into (name, ppid, total_cpu_ticks, rss_pages)."""
+    rpar = raw.rfind(b")")
+    lpar = raw.find(b"(", 0, rpar)
+    if lpar == -1 or rpar == -1:
         return None
 
-    name = raw[lpar + 1 : rpar]
-    tail = raw[rpar + 2 :].split()
-    if len(tail) < 22:
+    fields = _parse_stat_tail(raw, rpar + 2)
+    if fields is None:
         return None
 
+    ppid, utime, stime, rss_pages = fields
+    name = raw[lpar + 1 : rpar].decode("utf-8", errors="replace")
+    return (name, ppid, utime + stime, rss_pages)
+
+
+def parse_io_counters(raw: bytes) -> Optional[Tuple[int, int]]:
+    """Parse /proc/<pid>/io contents into (disk_bytes, xfer_bytes)."""
+    tokens = raw.split()
+    if len(tokens) <= _IO_WRITE_BYTES or tokens[_IO_READ_BYTES - 1] != b"read_bytes:":
+        return None
     try:
-        ppid = int(tail[1])
-        utime = int(tail[11])
-        stime = int(tail[12])
-        rss_pages = int(tail[21])
+        disk_total = int(tokens[_IO_READ_BYTES]) + int(tokens[_IO_WRITE_BYTES])
+        xfer_total = int(tokens[_IO_RCHAR]) + int(tokens[_IO_WCHAR])
     except ValueError:
         return None
+    return (disk_total, xfer_total)
+
+
+class FdCache:
+    """Long-lived /proc/<pid>/stat and /proc/<pid>/io descriptors, keyed by pid.
+
+    procfs returns fresh contents on every pread of an open descriptor, so the
+    steady state is one pread per file per sample instead of open+read+close.
+    Files are opened relative to a single /proc directory descriptor, which
+    saves the kernel the /proc path lookup on every open.
+
+    At most `max_pids` pids keep cached descriptors.  Pids beyond that, or
+    whose open hit the process/system fd limit (EMFILE/ENFILE), are read with
+    an uncached open+pread+close each sample until room frees up.
+    """
+
+    def __init__(self, max_pids: Optional[int] = None) -> None:
+        self.procfd = os.open("/proc", os.O_RDONLY | os.O_DIRECTORY)
+        self.max_pids = max_pids
+        # pid -> (stat_fd, io_fd); io_fd is -1 when /proc/<pid>/io is unreadable.
+        self.fds: Dict[int, Tuple[int, int]] = {}
+        # Tracked pids that are read without cached descriptors ->
+        # (b"<pid>/stat", b"<pid>/io"), formatted once per pid.
+        self.uncached: Dict[int, Tuple[bytes, bytes]] = {}
+        # pid -> b"<pid>/cmdline" (relative to procfd), formatted once per pid.
+        self.cmdline_paths: Dict[int, bytes] = {}
+
+    def sync(self, pids: Set[int]) -> None:
+        """Open descriptors for new pids and close those of pids that left."""
+        for pid in (self.fds.keys() | self.uncached.keys()) - pids:
+            self.drop(pid)
+        for pid in pids - self.fds.keys():
+            self._open(pid)
+
+    def _open(self, pid: int) -> None:
+        if self.max_pids is not None and len(self.fds) >= self.max_pids:
+            self._add_uncached(pid)
+            return
+        try:
+            stat_fd = os.open(b"%d/stat" % pid, os.O_RDONLY, dir_fd=self.procfd)
+        except (FileNotFoundError, PermissionError, ProcessLookupError):
+            return
+        except OSError as exc:
+            if exc.errno not in _FD_EXHAUSTED:
+                raise
+            self._add_uncached(pid)
+            return
+        try:
+            io_fd = os.open(b"%d/io" % pid, os.O_RDONLY, dir_fd=self.procfd)
+        except (FileNotFoundError, PermissionError, ProcessLookupError):
+            io_fd = -1
+        except OSError as exc:
+            os.close(stat_fd)
+            if exc.errno not in _FD_EXHAUSTED:
+                raise
+            self._add_uncached(pid)
+            return
+        self.uncached.pop(pid, None)
+        self.fds[pid] = (stat_fd, io_fd)
+        self.cmdline_paths[pid] = b"%d/cmdline" % pid
 
-    return (name, ppid, utime + stime, rss_pages)
+    def _add_uncached(self, pid: int) -> None:
+        if pid not in self.uncached:
+            self.uncached[pid] = (b"%d/stat" % pid, b"%d/io" % pid)
+            self.cmdline_paths[pid] = b"%d/cmdline" % pid
+
+    def _pread_uncached(self, path: bytes, size: int) -> Optional[bytes]:
+        try:
+            fd = os.open(path, os.O_RDONLY, dir_fd=self.procfd)
+        except (FileNotFoundError, PermissionError, ProcessLookupError):
+            return None
+        except OSError as exc:
+            if exc.errno not in _FD_EXHAUSTED:
+                raise
+            return None
+        try:
+            return os.pread(fd, size, 0)
+        except (PermissionError, ProcessLookupError):
+            return None
+        finally:
+            os.close(fd)
+
+    def drop(self, pid: int) -> None:
+        self.cmdline_paths.pop(pid, None)
+        self.uncached.pop(pid, None)
+        fds = self.fds.pop(pid, None)
+        if fds is None:
+            return
+        for fd in fds:
+            if fd != -1:
+                os.close(fd)
+
+    def close_all(self) -> None:
+        """Close every cached descriptor, including the /proc directory."""
+        for pid in list(self.fds):
+            self.drop(pid)
+        self.uncached.clear()
+        if self.procfd != -1:
+            os.close(self.procfd)
+            self.procfd = -1
+
+    def read_stat(self, pid: int) -> Optional[Tuple[str, int, int, int]]:
+        """Return (name, ppid, total_cpu_ticks, rss_pages)."""
+        fds = self.fds.get(pid)
+        if fds is None:
+            paths = self.uncached.get(pid)
+            if paths is None:
+                return None
+            raw = self._pread_uncached(paths[0], 1024)
+            return parse_stat(raw) if raw else None
+        try:
+            raw = os.pread(fds[0], 1024, 0)
+        except (PermissionError, ProcessLookupError):
+            raw = b""
+        if not raw:
+            # The process exited (reads on a stale procfs fd fail with ESRCH).
+            self.drop(pid)
+            return None
+        return parse_stat(raw)
+
+    def read_io_counters(self, pid: int) -> Optional[Tuple[int, int]]:
+        fds = self.fds.get(pid)
+        if fds is None:
+            paths = self.uncached.get(pid)
+            if paths is None:
+                return None
+            raw = self._pread_uncached(paths[1], 512)
+            return parse_io_counters(raw) if raw else None
+        if fds[1] == -1:
+            return None
+        try:
+            raw = os.pread(fds[1], 512, 0)
+        except (PermissionError, ProcessLookupError):
+            return None
+        return parse_io_counters(raw)
 
 
-def read_io_counters(pid: int) -> Optional[Tuple[int, int]]:
-    path = f"/proc/{pid}/io"
+def _read_all(path: Union[str, bytes], dir_fd: Optional[int] = None) -> bytes:
+    """Read a whole file with raw fd syscalls, optionally relative to dir_fd."""
+    fd = os.open(path, os.O_RDONLY, dir_fd=dir_fd)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            disk_total = 0
-            xfer_total = 0
-            for line in f:
-                if line.startswith("read_bytes:") or line.startswith("write_bytes:"):
-                    disk_total += int(line.split()[1])
-                elif line.startswith("rchar:") or line.startswith("wchar:"):
-                    xfer_total += int(line.split()[1])
-            return (disk_total, xfer_total)
-    except (FileNotFoundError, PermissionError, ProcessLookupError, ValueError):
-        return None
+        chunks = []
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return b"".join(chunks)
 
 
-def read_cmdline(pid: int) -> Optional[str]:
-    path = f"/proc/{pid}/cmdline"
+def read_cmdline(path: bytes, dir_fd: Optional[int] = None) -> Optional[str]:
     try:
-        with open(path, "rb") as f:
-            raw = f.read()
+        raw = _read_all(path, dir_fd)
     except (FileNotFoundError, PermissionError, ProcessLookupError):
         return None
+    except OSError as exc:
+        if exc.errno not in _FD_EXHAUSTED:
+            raise
+        return None
 
     if not raw:
         return None
@@ -162,30 +395,294 @@ def get_service_cgroup(service: str) -> Optional[str]:
     return value
 
 
-def pids_in_service_cgroup(service: str) -> Set[int]:
+def resolve_service_path(service: str) -> Optional[str]:
+    """Return the service's cgroup directory under /sys/fs/cgroup, if it exists."""
     cgroup = get_service_cgroup(service)
     if cgroup is None:
-        return set()
+        return None
 
     service_path = os.path.join("/sys/fs/cgroup", cgroup.lstrip("/"))
     if not os.path.isdir(service_path):
-        return set()
-
-    pids: Set[int] = set()
-    for dirpath, _dirnames, filenames in os.walk(service_path):
-        if "cgroup.procs" not in filenames:
-            continue
-        procs_file = os.path.join(dirpath, "cgroup.procs")
+        return None
+    return service_path
+
+
+def cgroup_dirs(
+    service_path: str, before_scan: Optional[Callable[[str], None]] = None
+) -> List[str]:
+    """Return service_path and every cgroup directory below it.
+
+    before_scan, if given, is called with each directory just before it is
+    listed.  Raises FileNotFoundError if service_path itself no longer exists.
+    """
+    dirs: List[str] = []
+    pending = [service_path]
+    while pending:
+        dirpath = pending.pop()
+        if before_scan is not None:
+            before_scan(dirpath)
         try:
-            with open(procs_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line.isdigit():
-                        pids.add(int(line))
-        except (FileNotFoundError, PermissionError, ProcessLookupError):
+            with os.scandir(dirpath) as entries:
+                subdirs = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            if dirpath == service_path:
+                raise
+            continue
+        except PermissionError:
             continue
+        dirs.append(dirpath)
+        pending.extend(subdirs)
+    return dirs
+
+
+class CgroupWatcher:
+    """Cached list of cgroup.procs files under a service cgroup.
+
+    The cgroup tree is walked once and every directory gets an inotify watch;
+    it is only walked again when a cgroup is created or removed.  Membership
+    itself is still read from cgroup.procs each sample because the kernel does
+    not raise inotify events on cgroup.procs when processes fork or exit.
+    Without inotify (e.g. no libc symbol), or if any directory cannot be
+    watched, the tree is walked on every call.
+    """
+
+    def __init__(self, service_path: str) -> None:
+        self.service_path = service_path
+        self.procs_files: List[str] = []
+        self.dirty = True
+        self.fd = -1
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            pass
+
+    def close(self) -> None:
+        if self.fd != -1:
+            os.close(self.fd)
+            self.fd = -1
+
+    def _drain_events(self) -> bool:
+        changed = False
+        while True:
+            try:
+                if not os.read(self.fd, 4096):
+                    return changed
+            except BlockingIOError:
+                return changed
+            changed = True
+
+    def _watch(self, dirpath: str) -> None:
+        # Called before dirpath is listed, so a child cgroup created after the
+        # listing still raises an event and triggers another rescan.
+        if self.fd == -1:
+            return
+        if self._add_watch(self.fd, os.fsencode(dirpath), _IN_WATCH_MASK) != -1:
+            return
+        if ctypes.get_errno() == errno.ENOENT:
+            # Already removed; its parent's watch reports that.
+            return
+        # e.g. ENOSPC once max_user_watches is exhausted: this part of the
+        # tree would go unwatched, so walk it every call instead.
+        self.close()
+
+    def _rescan(self) -> None:
+        dirs = cgroup_dirs(self.service_path, before_scan=self._watch)
+        self.procs_files = [os.path.join(dirpath, "cgroup.procs") for dirpath in dirs]
+
+    def pids(self) -> Set[int]:
+        """Read the current pid set.
+
+        Raises FileNotFoundError if the service cgroup no longer exists.
+        """
+        if self.fd == -1 or self._drain_events():
+            self.dirty = True
+        if self.dirty:
+            self._rescan()
+            self.dirty = False
+
+        pids: Set[int] = set()
+        for procs_file in self.procs_files:
+            try:
+                raw = _read_all(procs_file)
+            except FileNotFoundError:
+                if procs_file == self.procs_files[0]:
+                    raise
+                self.dirty = True
+                continue
+            except (PermissionError, ProcessLookupError):
+                continue
+            pids.update(map(int, raw.split()))
+        return pids
+
+
+def tracked_pids(service: str) -> Set[int]:
+    """Return the service's pids, resolving its cgroup path only when needed.
+
+    The watcher for the resolved path is cached in _CGROUP_WATCHER and replaced
+    (re-resolving via systemctl) only when it is unknown or the cgroup has
+    disappeared, e.g. after a service restart.
+    """
+    global _CGROUP_WATCHER
+    for _attempt in range(2):
+        if _CGROUP_WATCHER is None:
+            service_path = resolve_service_path(service)
+            if service_path is None:
+                return set()
+            _CGROUP_WATCHER = CgroupWatcher(service_path)
+        try:
+            return _CGROUP_WATCHER.pids()
+        except FileNotFoundError:
+            _CGROUP_WATCHER.close()
+            _CGROUP_WATCHER = None
+    return set()
+
 
-    return pids
+class ProcEventListener:
+    """Process fork/exec/exit notifications from the kernel proc connector.
+
+    Requires CAP_NET_ADMIN.  The listener also installs a signal wakeup pipe so
+    that SIGINT/SIGTERM interrupt a long wait for the next event.
+    """
+
+    def __init__(self) -> None:
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, _NETLINK_CONNECTOR)
+        try:
+            self.sock.bind((os.getpid(), _CN_IDX_PROC))
+            op = struct.pack("=I", _PROC_CN_MCAST_LISTEN)
+            cn_msg = _CN_MSG_HDR.pack(_CN_IDX_PROC, _CN_VAL_PROC, 0, 0, len(op), 0) + op
+            self.sock.send(_NLMSG_HDR.pack(_NLMSG_HDR.size + len(cn_msg), _NLMSG_DONE, 0, 0, os.getpid()) + cn_msg)
+            self.sock.setblocking(False)
+        except OSError:
+            self.sock.close()
+            raise
+        self.wakeup_r, wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        os.set_blocking(wakeup_w, False)
+        self._wakeup_w = wakeup_w
+        signal.set_wakeup_fd(wakeup_w)
+
+    def close(self) -> None:
+        signal.set_wakeup_fd(-1)
+        os.close(self.wakeup_r)
+        os.close(self._wakeup_w)
+        self.sock.close()
+
+    def drain_wakeup(self) -> None:
+        try:
+            os.read(self.wakeup_r, 512)
+        except BlockingIOError:
+            pass
+
+    def read_pids(self) -> Optional[Set[int]]:
+        """Drain pending events; return the tgids of processes that forked, exec'd or exited.
+
+        Thread creation and thread exit (pid != tgid) are ignored.  Returns None
+        if the socket buffer overflowed (ENOBUFS) and events were lost, since
+        cn_proc reports every process on the host and bursts can outrun us.
+        """
+        pids: Set[int] = set()
+        lost = False
+        offset = _NLMSG_HDR.size + _CN_MSG_HDR.size
+        while True:
+            try:
+                data = self.sock.recv(4096)
+            except BlockingIOError:
+                return None if lost else pids
+            except OSError as exc:
+                if exc.errno != errno.ENOBUFS:
+                    raise
+                lost = True
+                continue
+            if len(data) < offset + _PROC_EVENT_HDR.size + _PROC_EVENT_PIDS.size:
+                continue
+            what = _PROC_EVENT_HDR.unpack_from(data, offset)[0]
+            a, b, c, d = _PROC_EVENT_PIDS.unpack_from(data, offset + _PROC_EVENT_HDR.size)
+            if what == _PROC_EVENT_FORK:
+                if c == d:
+                    pids.add(b)
+            elif what in (_PROC_EVENT_EXEC, _PROC_EVENT_EXIT):
+                if a == b:
+                    pids.add(b)
+
+
+class SampleScheduler:
+    """Decides when the next sample is due and blocks until then.
+
+    Fixed-interval sampling follows absolute deadlines (start + k * interval),
+    so time spent sampling does not accumulate as drift; after an overrun the
+    late tick is taken once and the missed grid slots are skipped.  With a listener the
+    next sample is taken when a tracked process forks, execs or exits (but no
+    sooner than `interval` after the last one), or `heartbeat` seconds after
+    the last one otherwise.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        end_at: Optional[float],
+        listener: Optional[ProcEventListener] = None,
+        heartbeat: float = 0.0,
+    ) -> None:
+        self.interval = interval
+        self.end_at = end_at
+        self.listener = listener
+        self.heartbeat = heartbeat
+        self.next_deadline = time.monotonic()
+
+    def wait(
+        self,
+        sample_started: float,
+        tracked: AbstractSet[int],
+        on_input: Optional[Callable[[], bool]] = None,
+    ) -> bool:
+        """Block until the next sample is due.
+
+        `on_input` is called whenever stdin becomes readable; the wait ends and
+        False is returned if it returns False.
+        """
+        listener = self.listener
+        if listener is None:
+            next_deadline = self.next_deadline + self.interval
+            if next_deadline <= sample_started:
+                # The previous sample overran: skip the missed slots and stay on
+                # the start + k * interval grid rather than firing back to back.
+                missed = math.floor((sample_started - next_deadline) / self.interval) + 1
+                next_deadline += missed * self.interval
+            self.next_deadline = next_deadline
+            earliest = due = next_deadline
+        else:
+            earliest = sample_started + self.interval
+            due = sample_started + self.heartbeat
+
+        stdin_fd = sys.stdin.fileno() if on_input is not None else -1
+        watched = [] if on_input is None else [stdin_fd]
+        if listener is not None:
+            watched += [listener.sock, listener.wakeup_r]
+
+        while not STOP:
+            deadline = due if self.end_at is None else min(due, self.end_at)
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            if not watched:
+                time.sleep(timeout)
+                continue
+            readable, _, _ = select.select(watched, [], [], timeout)
+            for fd in readable:
+                if fd == stdin_fd:
+                    if not on_input():
+                        return False
+                elif fd is listener.sock:
+                    # Lost events (None) may have touched tracked pids too.
+                    changed = listener.read_pids()
+                    if changed is None or changed & tracked:
+                        due = min(due, earliest)
+                else:
+                    # Signal wakeup byte; the handler has already set STOP.
+                    listener.drain_wakeup()
+        return True
 
 
 def parse_args() -> argparse.Namespace:
@@ -219,6 +716,20 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="include full process command line in live and summary output",
     )
+    parser.add_argument(
+        "--event-driven",
+        action="store_true",
+        help=(
+            "sample when a tracked process forks, execs or exits instead of at a fixed "
+            "interval; requires root (CAP_NET_ADMIN) for the kernel proc connector"
+        ),
+    )
+    parser.add_argument(
+        "--heartbeat-factor",
+        type=float,
+        default=10.0,
+        help="with --event-driven, also sample every interval*N seconds without events (default: 10)",
+    )
     return parser.parse_args()
 
 
@@ -233,34 +744,68 @@ def print_header(include_cmdline: bool = False) -> None:
     print(header)
 
 
+_REPORT_ROW_FMT = "{:<8d} {:<20.20} {:<8d} {:<24} {:<25} {:<24} {}".format
+
+
 def fmt_triplet(values: Tuple[float, float, float], precision: int = 2) -> str:
     a, b, c = values
     return f"{a:.{precision}f}/{b:.{precision}f}/{c:.{precision}f}"
 
 
+def read_pid_bundles(
+    fd_cache: FdCache,
+    pids: List[int],
+    include_cmdline: bool = False,
+) -> List[Tuple[int, Tuple[str, int, int, int], Optional[Tuple[int, int]], Optional[str]]]:
+    """Read (pid, stat, io_counters, cmdline) for each pid whose stat is readable.
+
+    Safe to run for disjoint pid lists on several threads: each pid's cached
+    descriptors are only touched by the thread reading that pid.
+    """
+    bundles = []
+    append = bundles.append
+    read_stat = fd_cache.read_stat
+    read_io_counters = fd_cache.read_io_counters
+    cmdline_paths = fd_cache.cmdline_paths
+    procfd = fd_cache.procfd
+    for pid in pids:
+        stat = read_stat(pid)
+        if stat is None:
+            continue
+        cmdline = read_cmdline(cmdline_paths[pid], procfd) if include_cmdline else None
+        append((pid, stat, read_io_counters(pid), cmdline))
+    return bundles
+
+
 def sample_once(
     service: str,
     now: float,
     clk_tck: int,
     page_size: int,
     stats_by_pid: Dict[int, ProcessStats],
-    prev_by_pid: Dict[int, PrevSample],
+    fd_cache: FdCache,
+    pool: Optional[ThreadPoolExecutor],
     include_cmdline: bool = False,
-) -> int:
-    tracked = pids_in_service_cgroup(service)
+) -> Set[int]:
+    """Take one sample of every tracked pid and return the tracked pid set."""
+    tracked = tracked_pids(service)
+    fd_cache.sync(tracked)
     if not tracked:
-        return 0
+        return tracked
+
+    # Read phase: fetch raw counters and keep the per-pid bookkeeping here, so
+    # the rate pass below is straight arithmetic over the gathered batch.
+    pids = list(tracked)
+    if pool is not None and len(pids) > _READ_CHUNK:
+        chunks = [pids[i : i + _READ_CHUNK] for i in range(0, len(pids), _READ_CHUNK)]
+        read_chunk = functools.partial(read_pid_bundles, fd_cache, include_cmdline=include_cmdline)
+        bundles = itertools.chain.from_iterable(pool.map(read_chunk, chunks))
+    else:
+        bundles = read_pid_bundles(fd_cache, pids, include_cmdline=include_cmdline)
 
-    for pid in tracked:
-        stat = read_stat(pid)
-        if stat is None:
-            continue
+    batch = []
+    for pid, stat, io_counters, cmdline in bundles:
         name, ppid, cpu_ticks, rss_pages = stat
-        io_counters = read_io_counters(pid)
-        cmdline = read_cmdline(pid) if include_cmdline else None
-        disk_total = io_counters[0] if io_counters is not None else None
-        xfer_total = io_counters[1] if io_counters is not None else None
-        rss_bytes = rss_pages * page_size
 
         record = stats_by_pid.get(pid)
         if record is None:
@@ -278,67 +823,43 @@ def sample_once(
             if include_cmdline and cmdline:
                 record.cmdline = cmdline
 
-        prev = prev_by_pid.get(pid)
+        batch.append((record, cpu_ticks, rss_pages * page_size, io_counters))
+
+    # Rate pass over the whole batch.
+    cpu_pct_scale = 100.0 / clk_tck
+    for record, cpu_ticks, rss_bytes, io_counters in batch:
         cpu_pct: Optional[float] = None
         disk_bps: Optional[float] = None
         xfer_bps: Optional[float] = None
 
-        if prev is not None:
-            dt = now - prev.timestamp
-            if dt > 0:
-                cpu_pct = ((cpu_ticks - prev.cpu_ticks) / clk_tck) / dt * 100.0
-                if disk_total is not None:
-                    disk_bps = (disk_total - prev.disk_bytes) / dt
-                if xfer_total is not None:
-                    xfer_bps = (xfer_total - prev.xfer_bytes) / dt
-
-        if cpu_pct is not None:
-            cpu_pct = max(0.0, cpu_pct)
-            record.current_cpu = cpu_pct
-        else:
-            record.current_cpu = 0.0
+        prev_ts = record.prev_timestamp
+        dt = now - prev_ts if prev_ts is not None else 0.0
+        if dt > 0:
+            inv_dt = 1.0 / dt
+            cpu_pct = max(0.0, (cpu_ticks - record.prev_cpu_ticks) * cpu_pct_scale * inv_dt)
+            if io_counters is not None:
+                disk_bps = max(0.0, (io_counters[0] - record.prev_disk_bytes) * inv_dt)
+                xfer_bps = max(0.0, (io_counters[1] - record.prev_xfer_bytes) * inv_dt)
 
-        if disk_bps is not None:
-            disk_bps = max(0.0, disk_bps)
-            record.current_disk = disk_bps
-        else:
-            record.current_disk = 0.0
+        record.current_cpu = cpu_pct or 0.0
+        record.current_disk = disk_bps or 0.0
+        record.current_xfer = xfer_bps or 0.0
+        record.current_mem = rss_bytes
+        record.add_sample(cpu_pct, rss_bytes, disk_bps, xfer_bps)
 
-        if xfer_bps is not None:
-            xfer_bps = max(0.0, xfer_bps)
-            record.current_xfer = xfer_bps
-        else:
-            record.current_xfer = 0.0
-
-        record.current_mem = float(rss_bytes)
-        record.cpu.add(cpu_pct)
-        record.mem.add(float(rss_bytes))
-        record.disk.add(disk_bps)
-        record.xfer.add(xfer_bps)
-
-        if disk_total is not None or xfer_total is not None:
-            prev_by_pid[pid] = PrevSample(
-                cpu_ticks=cpu_ticks,
-                disk_bytes=disk_total if disk_total is not None else (prev.disk_bytes if prev else 0),
-                xfer_bytes=xfer_total if xfer_total is not None else (prev.xfer_bytes if prev else 0),
-                timestamp=now,
-            )
-        elif prev is None:
-            prev_by_pid[pid] = PrevSample(
-                cpu_ticks=cpu_ticks,
-                disk_bytes=0,
-                xfer_bytes=0,
-                timestamp=now,
-            )
-        else:
-            prev_by_pid[pid] = PrevSample(
-                cpu_ticks=cpu_ticks,
-                disk_bytes=prev.disk_bytes,
-                xfer_bytes=prev.xfer_bytes,
-                timestamp=now,
-            )
+        # Counters that could not be read this time keep their previous value.
+        record.prev_cpu_ticks = cpu_ticks
+        if io_counters is not None:
+            record.prev_disk_bytes, record.prev_xfer_bytes = io_counters
+        record.prev_timestamp = now
 
-    return len(tracked)
+    return tracked
+
+
+_LIVE_HEADER = "PID      NAME                 PPID     CPU%      MEM_MB    DISK_Bps    XFER_Bps"
+# One str.format call per row: fewer bytecode ops and no per-field string
+# pieces compared with an f-string (the template is still parsed per call).
+_LIVE_ROW_FMT = "{:<8d} {:<20.20} {:<8d} {:>8.2f} {:>9.2f} {:>10.2f} {:>10.2f}".format
 
 
 def render_live(
@@ -349,24 +870,39 @@ def render_live(
     clk_tck: int,
     page_size: int,
     stats_by_pid: Dict[int, ProcessStats],
-    prev_by_pid: Dict[int, PrevSample],
+    fd_cache: FdCache,
+    pool: Optional[ThreadPoolExecutor],
+    scheduler: SampleScheduler,
     include_cmdline: bool,
 ) -> None:
+    # Input is awaited with select() in the scheduler; getch() only drains it.
     stdscr.nodelay(True)
     curses.curs_set(0)
 
+    header = _LIVE_HEADER + " CMDLINE" if include_cmdline else _LIVE_HEADER
+    fmt_row = _LIVE_ROW_FMT
+
+    def handle_keys() -> bool:
+        while True:
+            char = stdscr.getch()
+            if char == -1:
+                return True
+            if char in (ord("q"), ord("Q")):
+                return False
+
     while not STOP:
         now = time.monotonic()
         if end_at is not None and now >= end_at:
             break
 
-        tracked_count = sample_once(
+        tracked = sample_once(
             service,
             now,
             clk_tck,
             page_size,
             stats_by_pid,
-            prev_by_pid,
+            fd_cache,
+            pool,
             include_cmdline=include_cmdline,
         )
 
@@ -374,32 +910,33 @@ def render_live(
         height, width = stdscr.getmaxyx()
 
         status = (
-            f"service={service} interval={interval:.2f}s tracked_now={tracked_count} "
+            f"service={service} interval={interval:.2f}s tracked_now={len(tracked)} "
             "q=quit Ctrl+C=stop"
         )
         stdscr.addnstr(0, 0, status, max(0, width - 1))
 
-        header = "PID      NAME                 PPID     CPU%      MEM_MB    DISK_Bps    XFER_Bps"
-        if include_cmdline:
-            header += " CMDLINE"
         stdscr.addnstr(1, 0, header, max(0, width - 1))
 
-        rows = sorted(
+        # Only rows 2..height-2 are drawn, so select the top entries with a
+        # bounded heap instead of sorting every tracked pid.
+        rows = heapq.nlargest(
+            max(0, height - 3),
             stats_by_pid.values(),
             key=lambda rec: (rec.current_cpu, rec.current_mem),
-            reverse=True,
         )
 
         row_idx = 2
         for rec in rows:
             if row_idx >= height - 1:
                 break
-            line = (
-                f"{rec.pid:<8d} {rec.name[:20]:<20} {rec.ppid:<8d} "
-                f"{rec.current_cpu:>8.2f} "
-                f"{(rec.current_mem / (1024 * 1024)):>9.2f} "
-                f"{rec.current_disk:>10.2f} "
-                f"{rec.current_xfer:>10.2f}"
+            line = fmt_row(
+                rec.pid,
+                rec.name,
+                rec.ppid,
+                rec.current_cpu,
+                rec.current_mem / (1024 * 1024),
+                rec.current_disk,
+                rec.current_xfer,
             )
             if include_cmdline:
                 line += f" {rec.cmdline}"
@@ -408,14 +945,9 @@ def render_live(
 
         stdscr.refresh()
 
-        char = stdscr.getch()
-        if char in (ord("q"), ord("Q")):
+        if not handle_keys() or not scheduler.wait(now, tracked, on_input=handle_keys):
             break
 
-        sleep_left = interval - (time.monotonic() - now)
-        if sleep_left > 0:
-            time.sleep(sleep_left)
-
 
 def main() -> int:
     args = parse_args()
@@ -423,52 +955,97 @@ def main() -> int:
     if args.interval <= 0:
         print("--interval must be > 0", file=sys.stderr)
         return 2
+    if args.heartbeat_factor < 1:
+        print("--heartbeat-factor must be >= 1", file=sys.stderr)
+        return 2
 
     signal.signal(signal.SIGINT, _handle_signal)
     signal.signal(signal.SIGTERM, _handle_signal)
 
+    global _CGROUP_WATCHER
+    service_path = resolve_service_path(args.service)
+    if service_path is not None:
+        _CGROUP_WATCHER = CgroupWatcher(service_path)
+
     clk_tck = os.sysconf(os.sysconf_names["SC_CLK_TCK"])
     page_size = os.sysconf("SC_PAGE_SIZE")
 
     stats_by_pid: Dict[int, ProcessStats] = {}
-    prev_by_pid: Dict[int, PrevSample] = {}
+    # Two cached descriptors per pid: raise the soft fd limit as far as allowed
+    # and size the cache to fit underneath it.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    max_cached = None if soft == resource.RLIM_INFINITY else max(0, (soft - _FD_RESERVE) // 2)
+    fd_cache = FdCache(max_pids=max_cached)
+    # procfs reads release the GIL, so larger pid sets are read in parallel
+    # when there is more than one CPU to run them on; with a single CPU the
+    # pool only adds hand-off overhead to an inline read.
+    cpus = os.process_cpu_count() or 1
+    pool = ThreadPoolExecutor(max_workers=min(16, cpus)) if cpus > 1 else None
+
+    listener: Optional[ProcEventListener] = None
+    heartbeat = args.interval * args.heartbeat_factor
+    if args.event_driven:
+        try:
+            listener = ProcEventListener()
+        except OSError as exc:
+            print(f"--event-driven unavailable ({exc}); sampling every {args.interval:.2f}s", file=sys.stderr)
 
     start = time.monotonic()
     end_at = start + args.duration if args.duration > 0 else None
+    scheduler = SampleScheduler(args.interval, end_at, listener, heartbeat)
 
-    if args.live:
-        curses.wrapper(
-            render_live,
-            args.service,
-            args.interval,
-            end_at,
-            clk_tck,
-            page_size,
-            stats_by_pid,
-            prev_by_pid,
-            args.show_cmdline,
-        )
-    else:
-        print(f"Tracking service={args.service} interval={args.interval:.2f}s")
-        print("Press Ctrl+C to stop." if end_at is None else f"Will stop after {args.duration:.1f}s.")
-
-        while not STOP:
-            now = time.monotonic()
-            if end_at is not None and now >= end_at:
-                break
-
-            _tracked_count = sample_once(
+    try:
+        if args.live:
+            curses.wrapper(
+                render_live,
                 args.service,
-                now,
+                args.interval,
+                end_at,
                 clk_tck,
                 page_size,
                 stats_by_pid,
-                prev_by_pid,
-                include_cmdline=args.show_cmdline,
+                fd_cache,
+                pool,
+                scheduler,
+                args.show_cmdline,
             )
-            sleep_left = args.interval - (time.monotonic() - now)
-            if sleep_left > 0:
-                time.sleep(sleep_left)
+        else:
+            print(f"Tracking service={args.service} interval={args.interval:.2f}s")
+            print("Press Ctrl+C to stop." if end_at is None else f"Will stop after {args.duration:.1f}s.")
+
+            while not STOP:
+                now = time.monotonic()
+                if end_at is not None and now >= end_at:
+                    break
+
+                tracked = sample_once(
+                    args.service,
+                    now,
+                    clk_tck,
+                    page_size,
+                    stats_by_pid,
+                    fd_cache,
+                    pool,
+                    include_cmdline=args.show_cmdline,
+                )
+                scheduler.wait(now, tracked)
+    finally:
+        # STOP (set from the SIGINT/SIGTERM handler) ends the loops above;
+        # release the worker threads, the event listener and the cached /proc
+        # and inotify descriptors on the way out.
+        if pool is not None:
+            pool.shutdown()
+        if listener is not None:
+            listener.close()
+        fd_cache.close_all()
+        if _CGROUP_WATCHER is not None:
+            _CGROUP_WATCHER.close()
 
     if not stats_by_pid:
         print("No matching process data collected.")
@@ -477,6 +1054,8 @@ def main() -> int:
     print()
     print_header(include_cmdline=args.show_cmdline)
 
+    fmt_row = _REPORT_ROW_FMT
+    lines = []
     for pid in sorted(stats_by_pid):
         rec = stats_by_pid[pid]
         cpu_min, cpu_max, cpu_avg = rec.cpu.as_tuple()
@@ -491,16 +1070,21 @@ def main() -> int:
         disk_min, disk_max, disk_avg = rec.disk.as_tuple()
         xfer_min, xfer_max, xfer_avg = rec.xfer.as_tuple()
 
-        line = (
-            f"{pid:<8d} {rec.name[:20]:<20} {rec.ppid:<8d} "
-            f"{fmt_triplet((cpu_min, cpu_max, cpu_avg), 2):<24} "
-            f"{fmt_triplet(mem_triplet, 2):<25} "
-            f"{fmt_triplet((disk_min, disk_max, disk_avg), 2):<24} "
-            f"{fmt_triplet((xfer_min, xfer_max, xfer_avg), 2)}"
+        line = fmt_row(
+            pid,
+            rec.name,
+            rec.ppid,
+            fmt_triplet((cpu_min, cpu_max, cpu_avg), 2),
+            fmt_triplet(mem_triplet, 2),
+            fmt_triplet((disk_min, disk_max, disk_avg), 2),
+            fmt_triplet((xfer_min, xfer_max, xfer_avg), 2),
         )
         if args.show_cmdline:
             line += f" {rec.cmdline}"
-        print(line)
+        lines.append(line)
+
+    # One write for the whole table instead of a print() (and flush) per pid.
+    sys.stdout.write("\n".join(lines) + "\n")
 
     return 0
 